@@ -1,6 +1,22 @@
+import collections
 import itertools
+import math
 import random
 
+import numpy as np
+
+# Largest frontier component solved exactly when guessing
+MAX_COMPONENT_CELLS = 32
+
+# Longest row kept in the Gaussian elimination system
+MAX_ELIMINATION_CELLS = 200
+
+# What the AI knows about each cell
+UNKNOWN = 0
+SAFE = 1
+MINE = 2
+MOVED = 3
+
 
 class Minesweeper():
     """
@@ -15,20 +31,15 @@ class Minesweeper():
         self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        self.board = np.zeros((height, width), dtype=bool)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Add mines randomly (cells numbered row by row)
+        for index in random.sample(range(height * width), mines):
+            self.mines.add(divmod(index, width))
+        self.board.flat[[i * width + j for i, j in self.mines]] = True
+
+        # Mine counts around every cell, computed once for the whole board
+        self.counts = neighbor_counts(self.board)
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -50,7 +61,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i, j])
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +69,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return int(self.counts[i, j])
 
     def won(self):
         """
@@ -84,6 +79,71 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def neighbor_counts(board):
+    """
+    Returns an array the shape of `board` holding, for every cell,
+    the number of mines within one row and column of it.
+    """
+    height, width = board.shape
+    # pad with a ring of empty cells so every shift stays in bounds
+    padded = np.pad(board.astype(np.uint8), 1)
+    counts = np.zeros((height, width), dtype=np.uint8)
+
+    # sum the 8 shifted copies of the board (a 3x3 convolution minus the middle)
+    for di in range(3):
+        for dj in range(3):
+            if (di, dj) != (1, 1):
+                counts += padded[di:di + height, dj:dj + width]
+    return counts
+
+
+def cancel(coefs, total, pivotCoefs, pivotTotal, cell):
+    """
+    Returns the row (coefs, total) with `cell` cancelled out of it using
+    the pivot row, scaling both so everything stays a whole number.
+    Rows are sparse dicts of cell -> coefficient plus a right hand side.
+    """
+    a, b = coefs[cell], pivotCoefs[cell]
+    new = {c: v * b for c, v in coefs.items()}
+    for c, v in pivotCoefs.items():
+        new[c] = new.get(c, 0) - v * a
+        if not new[c]:
+            del new[c]
+    return reduce_row(new, total * b - pivotTotal * a)
+
+
+def forced_cells(coefs, total):
+    """
+    Returns a dict mapping the cells a row forces to True (mine) or False
+    (safe). A row whose right hand side equals the smallest (or largest)
+    value its coefficients can add up to with cells being 0 or 1 forces
+    every cell in it.
+    """
+    low = sum(v for v in coefs.values() if v < 0)
+    high = sum(v for v in coefs.values() if v > 0)
+    if total == low:
+        # every positive cell is 0 and every negative one is 1
+        return {cell: v < 0 for cell, v in coefs.items()}
+    if total == high:
+        return {cell: v > 0 for cell, v in coefs.items()}
+    return {}
+
+
+def reduce_row(coefs, total):
+    """
+    Divides a row by the gcd of its numbers, keeping the first
+    coefficient positive.
+    """
+    if not coefs:
+        return coefs, total
+    divisor = math.gcd(total, *coefs.values())
+    if coefs[min(coefs)] < 0:
+        divisor = -divisor
+    if divisor == 1:
+        return coefs, total
+    return {c: v // divisor for c, v in coefs.items()}, total // divisor
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
@@ -151,17 +211,19 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, linear=False):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
-        self.allMoves = set()
+        # Total mines on the board, only used to weigh guesses
+        # (defaults to the 1 in 8 ratio of the standard 8x8 game)
+        self.total_mines = mines if mines is not None else height * width // 8
 
-        for y in range(height):
-            for x in range(width):
-                self.allMoves.add((x, y))
+        # Cells are numbered row by row: index = i * width + j
+        # What is known about every cell (UNKNOWN, SAFE, MINE or MOVED)
+        self.state = np.full(height * width, UNKNOWN, dtype=np.uint8)
 
         # Keep track of which cells have been clicked on
         self.moves_made = set()
@@ -170,26 +232,119 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
+        # Safe cells that haven't been clicked on yet
+        self.safeMoves = set()
+
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # Maps each undetermined cell to the sentences that mention it
+        self.cellSentences = {}
+
+        # Solved frontier components kept between moves
+        self.componentCache = {}
+
+        # Also combine overlapping sentences with Gaussian elimination
+        self.linear = linear
+
+        # Every sentence combined into reduced row echelon form, kept up
+        # to date as sentences are added and cells decided: pivot cell ->
+        # (coefs, total), and cells the rows force that aren't known yet
+        self.pivots = {}
+        self.forced = {}
+
+        # Counters from the last call to add_knowledge
+        self.propagation_stats = {
+            "sentences_touched": 0,
+            "inferences": 0,
+            "sentences_added": 0,
+            "sentences_pruned": 0
+        }
+
+    def index(self, cell):
+        """
+        Returns the cell index of an (i, j) cell.
+        """
+        return cell[0] * self.width + cell[1]
+
+    def cell(self, index):
+        """
+        Returns the (i, j) cell of a cell index.
+        """
+        return divmod(index, self.width)
+
+    def neighbors(self, index):
+        """
+        Returns the indexes of the cells within one row and column of `index`.
+        """
+        i, j = divmod(index, self.width)
+        rows = range(max(i - 1, 0), min(i + 2, self.height))
+        columns = range(max(j - 1, 0), min(j + 2, self.width))
+        return [r * self.width + c for r in rows for c in columns
+                if r != i or c != j]
+
     def mark_mine(self, cell):
         """
-        Marks a cell as a mine, and updates all knowledge
+        Marks a cell (by index) as a mine, and updates all knowledge
         to mark that cell as a mine as well.
+
+        Returns the sentences that changed because of it.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self.state[cell] = MINE
+        if self.linear:
+            self.substitute(cell, 1)
+        # a marked cell never shows up in a new sentence so drop it from the index
+        changed = self.cellSentences.pop(cell, [])
+        for sentence in changed:
             sentence.mark_mine(cell)
+        return changed
 
     def mark_safe(self, cell):
         """
-        Marks a cell as safe, and updates all knowledge
+        Marks a cell (by index) as safe, and updates all knowledge
         to mark that cell as safe as well.
+
+        Returns the sentences that changed because of it.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        if self.state[cell] == UNKNOWN:
+            self.state[cell] = SAFE
+            self.safeMoves.add(cell)
+            if self.linear:
+                self.substitute(cell, 0)
+        changed = self.cellSentences.pop(cell, [])
+        for sentence in changed:
             sentence.mark_safe(cell)
+        return changed
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base and indexes it by its cells.
+        Returns False if an equal sentence is already known.
+        """
+        # any equal sentence has to share the sentence's cells
+        if sentence.cells:
+            for other in self.cellSentences.get(next(iter(sentence.cells)), []):
+                if other == sentence:
+                    return False
+        self.knowledge.append(sentence)
+        for cell in sentence.cells:
+            self.cellSentences.setdefault(cell, []).append(sentence)
+        if self.linear and sentence.cells:
+            self.fold_row({cell: 1 for cell in sentence.cells}, sentence.count)
+        return True
+
+    def related_sentences(self, sentence):
+        """
+        Returns the other sentences that share at least one cell with `sentence`.
+        """
+        related = {}
+        for cell in sentence.cells:
+            for other in self.cellSentences.get(cell, []):
+                if other is not sentence:
+                    related[id(other)] = other
+        return related.values()
 
     def add_knowledge(self, cell, count):
         """
@@ -206,104 +361,168 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
+        cell = self.index(cell)
+        pending = self.mark_safe(cell)
         self.moves_made.add(cell)
-        self.safes.add(cell)
+        self.state[cell] = MOVED
+        self.safeMoves.discard(cell)
 
         neighbors = set()
 
         # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):  # add 2 because loops for one less than max when starting at not 0
-            for j in range(cell[1] - 1, cell[1] + 2):  # y then x (i, j) is y, x
+        for neighbor in self.neighbors(cell):
+            state = self.state[neighbor]
+            # if its a known mine we can simplify and not put it in
+            if state == MINE:
+                count -= 1
+            # the cell's state is not determined
+            elif state == UNKNOWN:
+                neighbors.add(neighbor)
+        # make sentence relating neighbors to amount of mines nearby
+        sentence = Sentence(neighbors, count)
+        if self.add_sentence(sentence):
+            pending.append(sentence)
 
-                # Ignore the cell itself
-                if (i, j) == cell:
+        self.propagate(pending)
+
+    def propagate(self, pending):
+        """
+        Infer new knowledge until nothing else can be concluded.
+
+        Works off a queue of sentences whose cells changed instead of
+        rescanning the whole knowledge base, and records counters for
+        this round in self.propagation_stats. In linear mode, the cells
+        the eliminated system forces are used whenever the queue empties.
+        """
+        stats = {
+            "sentences_touched": 0,
+            "inferences": 0,
+            "sentences_added": 0,
+            "sentences_pruned": 0
+        }
+
+        queue = collections.deque(pending)
+        queued = {id(sentence) for sentence in queue}
+
+        def enqueue(sentences):
+            for sentence in sentences:
+                if id(sentence) not in queued:
+                    queued.add(id(sentence))
+                    queue.append(sentence)
+
+        while True:
+            while queue:
+                sentence = queue.popleft()
+                queued.discard(id(sentence))
+
+                # sentence was already resolved by an earlier inference
+                if not sentence.cells:
+                    continue
+                stats["sentences_touched"] += 1
+
+                # all cells are mines or all are safe = resolve the whole sentence
+                known_mines = sentence.known_mines()
+                if known_mines:
+                    for cell in known_mines.copy():
+                        stats["inferences"] += 1
+                        enqueue(self.mark_mine(cell))
+                    continue
+                known_safes = sentence.known_safes()
+                if known_safes:
+                    for cell in known_safes.copy():
+                        stats["inferences"] += 1
+                        enqueue(self.mark_safe(cell))
                     continue
 
-                # must be cell within board range
-                if (i, j) in self.allMoves:
-                    # if its a known mine we can simplify and not put it in
-                    if (i, j) in self.mines:
-                        count -= 1
+                # compare only with sentences that share a cell (others can't be subsets)
+                for other in list(self.related_sentences(sentence)):
+                    if other.cells < sentence.cells:
+                        subSent = Sentence(sentence.cells - other.cells,
+                                           sentence.count - other.count)
+                    elif sentence.cells < other.cells:
+                        subSent = Sentence(other.cells - sentence.cells,
+                                           other.count - sentence.count)
+                    else:
                         continue
-                    # the cell's state is not determined
-                    if ((i, j) not in self.moves_made
-                    and (i, j) not in self.safes):
-                        # add cell to neighbors
-                        neighbors.add((i, j))
-        # make sentence relating neighbors to amount of mines nearby
-        self.knowledge.append(Sentence(neighbors, count))
-        def inferKnowledge(safes=set(), mines=set()):
-            """ figure out new knowledge from knowledge base """
-
-            change = False  # if we change something we know to call again to see if we can make more infers
-
-            newSentences = []  # sentences we want to add after iterating
-
-            # we might be able to keep inferring if find new mines or safes
-            newMines = set()
-            newSafes = set()
-
-            for i in range(len(self.knowledge)):
-                # mark cells safe
-                for cell in safes:
-                    self.knowledge[i].mark_safe(cell)
-
-                # mark cells as mines
-                for cell in mines:
-                    self.knowledge[i].mark_mine(cell)
-
-                # add any mines or safes that can be found based off that
-                known_mines = self.knowledge[i].known_mines()
-
-                # new mines figured out
-                if known_mines and not known_mines <= self.mines:
-                    # add mines to new mines found
-                    newMines.union(known_mines - self.mines)
-                    change = True
-                    self.mines = self.mines.union(known_mines)
-
-                known_safes = self.knowledge[i].known_safes()
-                # new safes figured out
-                if known_safes and not known_safes <= self.safes:
-                    # add to new safes found
-                    newSafes.union(known_safes - self.safes)
-                    change = True
-                    self.safes = self.safes.union(known_safes)
-                # don't run for last element
-                if i < len(self.knowledge):
-                    # compare every sentence with each other (not including ones already compared)
-                    for n in range(i + 1, len(self.knowledge)):
-                        # we don't need to infer if the tile is 0, any new sentences won't help
-                        if self.knowledge[i].count == 0 or self.knowledge[n].count == 0:
-                            continue
-                        # if one is a subset of the other
-                        if self.knowledge[i].cells < self.knowledge[n].cells:
-                            # construct new sentence with subset
-                            subsetCells = self.knowledge[n].cells - self.knowledge[i].cells
-                            subsetCount = self.knowledge[n].count - self.knowledge[i].count
-                            subSent = Sentence(subsetCells, subsetCount)
-                            # ensure the subset is not already made
-                            if subSent in self.knowledge:
-                                break
-                            else:  # no subset, make it
-                                newSentences.append(subSent)
-                                # we might be able to infer from this new sent
-                                change = True
-                        # subset could be the other way around
-                        elif self.knowledge[n].cells < self.knowledge[i].cells:
-                            subsetCells = self.knowledge[i].cells - self.knowledge[n].cells
-                            subsetCount = self.knowledge[i].count - self.knowledge[n].count
-                            subSent = Sentence(subsetCells, subsetCount)
-                            if subSent in self.knowledge:
-                                break
-                            else:
-                                newSentences.append(subSent)
-                                change = True
-            self.knowledge = self.knowledge + newSentences
-            if change:
-                inferKnowledge(newMines, newSafes)
-
-        inferKnowledge({cell})
+                    # ensure the subset is not already made
+                    if self.add_sentence(subSent):
+                        stats["sentences_added"] += 1
+                        enqueue([subSent])
+
+            # subset rule is done, see if combining sentences gets any further
+            if not self.linear:
+                break
+            found = self.eliminate()
+            if not found:
+                break
+            for cell, isMine in found.items():
+                stats["inferences"] += 1
+                enqueue(self.mark_mine(cell) if isMine else self.mark_safe(cell))
+
+        # drop sentences with nothing left to say
+        size = len(self.knowledge)
+        self.knowledge = [sentence for sentence in self.knowledge if sentence.cells]
+        stats["sentences_pruned"] = size - len(self.knowledge)
+
+        self.propagation_stats = stats
+
+    def eliminate(self):
+        """
+        Returns a dict mapping the undecided cells the Gaussian elimination
+        system forces to True (mine) or False (safe), and forgets them.
+        """
+        found = {cell: isMine for cell, isMine in self.forced.items()
+                 if self.state[cell] == UNKNOWN}
+        self.forced = {}
+        return found
+
+    def fold_row(self, coefs, total):
+        """
+        Adds the row sum(coefs[cell] * cell) == total to the eliminated
+        system, keeping it in reduced row echelon form, and notes the cells
+        any row it changed now forces.
+
+        Only the new row and the rows holding its pivot are touched, so
+        every move reuses the elimination done for the moves before it.
+        """
+        for cell, (pivotCoefs, pivotTotal) in self.pivots.items():
+            if cell in coefs:
+                coefs, total = cancel(coefs, total, pivotCoefs, pivotTotal, cell)
+        # row was a combination of earlier ones (or too long to be worth it)
+        if not coefs or len(coefs) > MAX_ELIMINATION_CELLS:
+            return
+        pivot = min(coefs)
+        # clear the new pivot out of the earlier rows
+        for cell, (pivotCoefs, pivotTotal) in self.pivots.items():
+            if pivot in pivotCoefs:
+                row = cancel(pivotCoefs, pivotTotal, coefs, total, pivot)
+                self.pivots[cell] = row
+                self.forced.update(forced_cells(*row))
+        self.pivots[pivot] = (coefs, total)
+        self.forced.update(forced_cells(coefs, total))
+
+    def substitute(self, cell, value):
+        """
+        Puts the now known `value` of `cell` (1 for a mine, 0 if safe) into
+        every row of the eliminated system that mentions it.
+        """
+        # a pivot is in no other row, so its row is folded in again after
+        pivotRow = self.pivots.pop(cell, None)
+        for pivot, (coefs, total) in list(self.pivots.items()):
+            if cell in coefs:
+                coefs = dict(coefs)
+                total -= coefs.pop(cell) * value
+                if coefs:
+                    self.pivots[pivot] = reduce_row(coefs, total)
+                    self.forced.update(forced_cells(*self.pivots[pivot]))
+                else:
+                    del self.pivots[pivot]
+        if pivotRow:
+            coefs, total = pivotRow
+            coefs = dict(coefs)
+            total -= coefs.pop(cell) * value
+            if coefs:
+                self.fold_row(*reduce_row(coefs, total))
 
     def make_safe_move(self):
         """
@@ -314,11 +533,10 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        # finds safe moves that aren't already made
-        safeMoves = self.safes - self.moves_made
-        if len(safeMoves):
+        # safe moves that aren't already made
+        if self.safeMoves:
             # return a safe move
-            return next(iter(safeMoves))
+            return self.cell(next(iter(self.safeMoves)))
         else:
             # no safe moves
             return None
@@ -326,13 +544,222 @@ class MinesweeperAI():
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
+        Should choose among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        Picks the cell least likely to be a mine (randomly among ties).
         """
-        randomMoves = self.allMoves - self.moves_made - self.mines
-        if len(randomMoves):
-            # turns set into list in order to get a random index/move
-            return list(randomMoves)[random.randrange(len(randomMoves))]
-        else:
+        if self.safeMoves:
+            return self.make_safe_move()
+        frontierP, outside, outsideP = self.guess_probabilities()
+        if not frontierP and not len(outside):
             return None
+
+        # floats from different components can differ in the last digits
+        lowest = min(frontierP.values(), default=1.0)
+        if len(outside) and outsideP < lowest - 1e-12:
+            lowest = outsideP
+        bestMoves = [cell for cell, p in frontierP.items()
+                     if p <= lowest + 1e-12]
+        # every unconstrained cell is as good as the next
+        bestOutside = len(outside) if outsideP <= lowest + 1e-12 else 0
+
+        choice = random.randrange(len(bestMoves) + bestOutside)
+        if choice < len(bestMoves):
+            return self.cell(bestMoves[choice])
+        return self.cell(int(outside[choice - len(bestMoves)]))
+
+    def guess_probabilities(self):
+        """
+        Returns (frontierP, outside, outsideP): a dict of mine probabilities
+        for cells in the knowledge base, an array with the indexes of all
+        other undetermined cells, and the probability shared by those cells.
+
+        The frontier (cells mentioned in the knowledge base) is split into
+        components that share no sentences. Each component is solved on its
+        own, and the components are combined using the number of mines left
+        on the board, with the rest spread evenly over unconstrained cells.
+        """
+        probabilities = {}
+        unknownCount = int(np.count_nonzero(self.state == UNKNOWN))
+        if not unknownCount:
+            return probabilities, np.zeros(0, dtype=np.intp), 0.0
+
+        components = self.frontier_components()
+        solved = []
+        cache = {}
+        for sentences in components:
+            key = frozenset((frozenset(s.cells), s.count) for s in sentences)
+            if key in self.componentCache:
+                cache[key] = self.componentCache[key]
+            else:
+                cache[key] = self.solve_component(sentences)
+            solved.append(cache[key])
+        # only keep components that are still on the frontier
+        self.componentCache = cache
+
+        frontier = set()
+        for cells, _, _ in solved:
+            frontier.update(cells)
+        outside = unknownCount - len(frontier)
+        minesLeft = self.total_mines - len(self.mines)
+
+        # distribution of mines over the whole frontier (mines -> ways)
+        def combine(dists):
+            total = {0: 1}
+            for ways in dists:
+                merged = {}
+                for k1, w1 in total.items():
+                    for k2, w2 in ways.items():
+                        merged[k1 + k2] = merged.get(k1 + k2, 0) + w1 * w2
+                total = merged
+            return total
+
+        # ways to place the remaining mines outside the frontier
+        def outsideWays(k):
+            if k < 0 or k > outside:
+                return 0
+            return math.comb(outside, k)
+
+        everything = combine(ways for _, ways, _ in solved)
+        total = sum(w * outsideWays(minesLeft - k) for k, w in everything.items())
+
+        if total:
+            weigh = outsideWays
+        else:
+            # mine count doesn't fit (e.g. it was guessed), weigh components alone
+            weigh = lambda k: 1
+            total = sum(everything.values())
+
+        for n, (cells, ways, counts) in enumerate(solved):
+            rest = combine(w for m, (_, w, _) in enumerate(solved) if m != n)
+            # weight of each mine count inside this component
+            weights = {}
+            for k in ways:
+                weights[k] = sum(w * weigh(minesLeft - k - r)
+                                 for r, w in rest.items())
+            for index, cell in enumerate(cells):
+                mineWays = sum(counts[k][index] * weights[k] for k in ways)
+                probabilities[cell] = mineWays / total
+
+        outsideP = 0.0
+        if outside:
+            if weigh is outsideWays:
+                expected = sum(w * outsideWays(minesLeft - k) * (minesLeft - k)
+                               for k, w in everything.items())
+                outsideP = expected / total / outside
+            else:
+                # fall back to the average density of what's left
+                outsideP = min(max(minesLeft / unknownCount, 0.0), 1.0)
+
+        # undetermined cells that no sentence mentions
+        isOutside = self.state == UNKNOWN
+        isOutside[list(frontier)] = False
+        return probabilities, np.flatnonzero(isOutside), outsideP
+
+    def frontier_components(self):
+        """
+        Returns the knowledge base split into lists of sentences
+        where no two lists share a cell.
+        """
+        parent = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        sentences = [s for s in self.knowledge if s.cells]
+        for sentence in sentences:
+            cells = list(sentence.cells)
+            for cell in cells:
+                parent.setdefault(cell, cell)
+            for cell in cells[1:]:
+                parent[find(cell)] = find(cells[0])
+
+        components = {}
+        for sentence in sentences:
+            root = find(next(iter(sentence.cells)))
+            components.setdefault(root, []).append(sentence)
+        return list(components.values())
+
+    def solve_component(self, sentences):
+        """
+        Enumerates the mine placements that satisfy every sentence of a
+        frontier component.
+
+        Returns (cells, ways, counts) where ways[k] is the number of placements
+        with k mines and counts[k][i] is how many of those have a mine in
+        cells[i]. Components too big to enumerate fall back to each cell's
+        worst single-sentence ratio.
+        """
+        # order cells so each sentence gets filled in as early as possible
+        cells = []
+        seen = set()
+        for sentence in sorted(sentences, key=lambda s: len(s.cells)):
+            for cell in sorted(sentence.cells):
+                if cell not in seen:
+                    seen.add(cell)
+                    cells.append(cell)
+
+        if len(cells) > MAX_COMPONENT_CELLS:
+            return self.estimate_component(cells, sentences)
+
+        index = {cell: i for i, cell in enumerate(cells)}
+        # per sentence: mines still needed and cells still unassigned
+        need = [s.count for s in sentences]
+        left = [len(s.cells) for s in sentences]
+        cellSentences = [[] for _ in cells]
+        for n, sentence in enumerate(sentences):
+            for cell in sentence.cells:
+                cellSentences[index[cell]].append(n)
+
+        ways = {}
+        counts = {}
+        assigned = [0] * len(cells)
+
+        def search(i, mines):
+            if i == len(cells):
+                ways[mines] = ways.get(mines, 0) + 1
+                tally = counts.setdefault(mines, [0] * len(cells))
+                for n, value in enumerate(assigned):
+                    tally[n] += value
+                return
+            for value in (0, 1):
+                ok = True
+                for n in cellSentences[i]:
+                    need[n] -= value
+                    left[n] -= 1
+                    if need[n] < 0 or need[n] > left[n]:
+                        ok = False
+                if ok:
+                    assigned[i] = value
+                    search(i + 1, mines + value)
+                for n in cellSentences[i]:
+                    need[n] += value
+                    left[n] += 1
+            assigned[i] = 0
+
+        search(0, 0)
+
+        if not ways:
+            # contradictory knowledge, don't trust the component
+            return self.estimate_component(cells, sentences)
+        return cells, ways, counts
+
+    def estimate_component(self, cells, sentences):
+        """
+        Cheap stand-in for solve_component on huge components. Puts every
+        cell at its highest count / size ratio across sentences and reports
+        the expected number of mines as the only possible count.
+        """
+        ratio = {cell: 0.0 for cell in cells}
+        for sentence in sentences:
+            for cell in sentence.cells:
+                ratio[cell] = max(ratio[cell], sentence.count / len(sentence.cells))
+        mines = round(sum(ratio.values()))
+        # scale so the counts read as probabilities once divided by ways
+        scale = 1000
+        counts = {mines: [round(ratio[cell] * scale) for cell in cells]}
+        return cells, {mines: scale}, counts
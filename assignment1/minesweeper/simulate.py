@@ -0,0 +1,205 @@
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+# Board sizes played when none are given (height, width, mines)
+BOARDS = [(8, 8, 8), (16, 16, 40), (16, 30, 99)]
+
+# How many points of the game to sample knowledge base size at
+KNOWLEDGE_POINTS = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper AI games without a display and report stats."
+    )
+    parser.add_argument("-n", "--games", type=int, default=100,
+                        help="games to play per board (default: 100)")
+    parser.add_argument("-b", "--board", action="append", default=[],
+                        help="HEIGHTxWIDTH, can be given more than once")
+    parser.add_argument("-d", "--density", action="append", type=float, default=[],
+                        help="fraction of cells that are mines, can be given more than once")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="seed of the first game, game k uses seed + k (default: 0)")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("-l", "--linear", action="store_true",
+                        help="let the AI use Gaussian elimination as well")
+    parser.add_argument("-o", "--output", help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    boards = make_boards(args.board, args.density)
+
+    results = []
+    with multiprocessing.Pool(args.processes) as pool:
+        for height, width, mines in boards:
+            games = [(height, width, mines, args.seed + k, args.linear)
+                     for k in range(args.games)]
+            start = time.perf_counter()
+            played = pool.map(play_game, games)
+            elapsed = time.perf_counter() - start
+            summary = summarize(played, elapsed)
+            summary["board"] = {"height": height, "width": width, "mines": mines}
+            results.append(summary)
+            print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def make_boards(boards, densities):
+    """
+    Turn "HEIGHTxWIDTH" strings and mine densities into (height, width, mines)
+    tuples. With no boards given, use the standard beginner, intermediate and
+    expert boards (or those sizes with each density, if densities are given).
+    """
+    if not boards and not densities:
+        return BOARDS
+
+    sizes = []
+    for board in boards:
+        height, width = board.lower().split("x")
+        sizes.append((int(height), int(width)))
+    if not sizes:
+        sizes = [(height, width) for height, width, _ in BOARDS]
+
+    made = []
+    for height, width in sizes:
+        if not densities:
+            # same ratio as the standard 8x8 game
+            made.append((height, width, height * width // 8))
+        for density in densities:
+            # keep at least one safe cell to start from
+            mines = min(round(height * width * density), height * width - 1)
+            made.append((height, width, mines))
+    return made
+
+
+def play_game(game):
+    """
+    Play one game with the AI making every move. `game` is a tuple of
+    (height, width, mines, seed, linear).
+
+    Return a dict with whether the game was won, how many moves were made,
+    the total time spent, the seconds each add_knowledge and guess took,
+    and the knowledge base size after every move.
+    """
+    height, width, mines, seed, linear = game
+
+    # both the board and the AI's guesses use the random module
+    random.seed(seed)
+    board = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, mines=mines, linear=linear)
+
+    inferenceTimes = []
+    guessTimes = []
+    knowledgeSizes = []
+    won = False
+
+    start = time.perf_counter()
+    while True:
+        move = ai.make_safe_move()
+        if move is None:
+            guessStart = time.perf_counter()
+            move = ai.make_random_move()
+            guessTimes.append(time.perf_counter() - guessStart)
+            if move is None:
+                break
+        if board.is_mine(move):
+            break
+
+        inferenceStart = time.perf_counter()
+        ai.add_knowledge(move, board.nearby_mines(move))
+        inferenceTimes.append(time.perf_counter() - inferenceStart)
+        knowledgeSizes.append(len(ai.knowledge))
+
+        # every safe cell has been revealed
+        if len(ai.moves_made) == height * width - mines:
+            won = True
+            break
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seed": seed,
+        "won": won,
+        "moves": len(ai.moves_made),
+        "elapsed": elapsed,
+        "inference_times": inferenceTimes,
+        "guess_times": guessTimes,
+        "knowledge_sizes": knowledgeSizes
+    }
+
+
+def percentiles(times):
+    """
+    Return the 50th, 90th and 99th percentile and the max of `times`
+    in milliseconds.
+    """
+    if not times:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p90, p99 = np.percentile(times, [50, 90, 99]) * 1000
+    return {"p50": p50, "p90": p90, "p99": p99, "max": max(times) * 1000}
+
+
+def summarize(played, elapsed):
+    """
+    Combine the results of play_game into the stats for one board.
+    `elapsed` is the wall clock time it took to play all of them.
+    """
+    moves = sum(game["moves"] for game in played)
+    aiTime = sum(game["elapsed"] for game in played)
+
+    # average knowledge base size at evenly spaced points through each game
+    knowledge = np.zeros(KNOWLEDGE_POINTS)
+    counted = 0
+    for game in played:
+        sizes = game["knowledge_sizes"]
+        if sizes:
+            points = np.linspace(0, len(sizes) - 1, KNOWLEDGE_POINTS).round().astype(int)
+            knowledge += np.array(sizes)[points]
+            counted += 1
+    if counted:
+        knowledge /= counted
+
+    return {
+        "games": len(played),
+        "win_rate": sum(game["won"] for game in played) / len(played),
+        "moves": moves,
+        "moves_per_second": moves / aiTime if aiTime else 0.0,
+        "wall_time": elapsed,
+        "inference_ms": percentiles(
+            [t for game in played for t in game["inference_times"]]),
+        "guess_ms": percentiles(
+            [t for game in played for t in game["guess_times"]]),
+        "knowledge_size": [round(size, 1) for size in knowledge.tolist()],
+        "max_knowledge_size": max(
+            (max(game["knowledge_sizes"], default=0) for game in played), default=0)
+    }
+
+
+def print_summary(summary):
+    """
+    Print the stats for one board.
+    """
+    board = summary["board"]
+    print(f"{board['height']}x{board['width']}, {board['mines']} mines "
+          f"({summary['games']} games, {summary['wall_time']:.2f}s)")
+    print(f"  Win rate: {100 * summary['win_rate']:.1f}%")
+    print(f"  Moves per second: {summary['moves_per_second']:.0f}")
+    for name, field in [("Inference", "inference_ms"), ("Guess", "guess_ms")]:
+        times = summary[field]
+        print(f"  {name} ms: p50 {times['p50']:.3f}  p90 {times['p90']:.3f}  "
+              f"p99 {times['p99']:.3f}  max {times['max']:.3f}")
+    sizes = ", ".join(f"{size:g}" for size in summary["knowledge_size"])
+    print(f"  Knowledge size over game: {sizes} (max {summary['max_knowledge_size']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+from heredity import METHODS, RHAT_LIMIT, compute, inheritance_table, load_data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute gene and trait probabilities for a directory of families."
+    )
+    parser.add_argument("directory", help="directory of family CSV files")
+    parser.add_argument("output", help="file to write results to (.json or .csv)")
+    parser.add_argument("-m", "--method", choices=METHODS, default="exact",
+                        help="how to compute the probabilities (default: exact)")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    if not args.output.endswith((".json", ".csv")):
+        parser.error("output must end in .json or .csv")
+
+    files = sorted(
+        os.path.join(args.directory, filename)
+        for filename in os.listdir(args.directory)
+        if filename.endswith(".csv")
+    )
+
+    start = time.perf_counter()
+    # each worker builds the inheritance table once and reuses it for every family
+    with multiprocessing.Pool(args.processes, initializer=inheritance_table) as pool:
+        results = pool.map(process_family, [(filename, args.method) for filename in files])
+    elapsed = time.perf_counter() - start
+
+    if args.output.endswith(".json"):
+        write_json(results, args.output)
+    else:
+        write_csv(results, args.output)
+
+    failed = [result for result in results if result["error"]]
+    for result in failed:
+        print(f"{result['file']}: {result['error']}")
+    for result in results:
+        unconverged = [person for person, rhat in (result["rhat"] or {}).items()
+                       if rhat > RHAT_LIMIT]
+        if unconverged:
+            print(f"{result['file']}: chains have not converged for {', '.join(unconverged)}")
+    print(f"Processed {len(results) - len(failed)} of {len(results)} families "
+          f"in {elapsed:.2f}s")
+
+
+def process_family(job):
+    """
+    Compute probabilities for one family file. `job` is (filename, method).
+
+    Return a dict with the file name, number of people, seconds taken,
+    the probabilities (None if they couldn't be computed), their standard
+    errors and each person's R-hat (None unless sampled) and an error
+    message (None if they could).
+    """
+    filename, method = job
+    start = time.perf_counter()
+    people = {}
+    probabilities = errors = rhat = None
+    error = None
+    try:
+        people = load_data(filename)
+        # already inside a worker, so keep any sampling chains in this process
+        probabilities, errors, rhat = compute(people, method, processes=1)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+
+    return {
+        "file": os.path.basename(filename),
+        "people": len(people),
+        "seconds": time.perf_counter() - start,
+        "probabilities": probabilities,
+        "errors": errors,
+        "rhat": rhat,
+        "error": error
+    }
+
+
+def write_json(results, filename):
+    """
+    Write results as a JSON list with one object per family.
+    """
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def write_csv(results, filename):
+    """
+    Write results as a CSV with one row per person. The standard error
+    and R-hat columns are left empty unless the method sampled.
+    """
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["family", "person", "gene_0", "gene_1", "gene_2",
+                         "trait_true", "trait_false",
+                         "gene_0_error", "gene_1_error", "gene_2_error",
+                         "trait_true_error", "trait_false_error", "rhat",
+                         "seconds", "error"])
+        for result in results:
+            if result["error"]:
+                writer.writerow([result["file"]] + [""] * 12 +
+                                [f"{result['seconds']:.6f}", result["error"]])
+                continue
+            for person, dist in result["probabilities"].items():
+                if result["errors"]:
+                    errors = result["errors"][person]
+                    sampled = [errors["gene"][0], errors["gene"][1], errors["gene"][2],
+                               errors["trait"][True], errors["trait"][False],
+                               result["rhat"][person]]
+                else:
+                    sampled = [""] * 6
+                writer.writerow([
+                    result["file"], person,
+                    dist["gene"][0], dist["gene"][1], dist["gene"][2],
+                    dist["trait"][True], dist["trait"][False]
+                ] + sampled + [f"{result['seconds']:.6f}", ""])
+
+
+if __name__ == "__main__":
+    main()
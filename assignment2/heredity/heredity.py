@@ -1,5 +1,9 @@
 import csv
+import functools
+import heapq
 import itertools
+import multiprocessing
+import random
 import sys
 
 PROBS = {
@@ -36,16 +40,78 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Possible amounts of the gene a person can have
+GENES = (0, 1, 2)
+
+# Ways to compute the probabilities, see main
+METHODS = ["exact", "enumerate", "vectorized", "sample"]
+
+# Gene assignments scored at once by enumerate_vectorized
+BATCH_SIZE = 3 ** 10
+
+# Gibbs sampling defaults: sweeps kept per chain and number of chains
+SAMPLES = 10000
+CHAINS = 4
+
+# Batches each chain's sweeps are split into for standard errors
+SAMPLE_BATCHES = 20
+
+# R-hat above this means the chains disagree and need more samples
+RHAT_LIMIT = 1.1
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python heredity.py data.csv [method]")
+    method = sys.argv[2] if len(sys.argv) == 3 else "exact"
+    if method not in METHODS:
+        sys.exit(f"Method must be one of: {', '.join(METHODS)}")
     people = load_data(sys.argv[1])
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    probabilities, errors, rhat = compute(people, method)
+    if rhat:
+        unconverged = [person for person in people if rhat[person] > RHAT_LIMIT]
+        if unconverged:
+            print(f"Warning: chains have not converged for {', '.join(unconverged)}")
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                if errors:
+                    print(f"    {value}: {p:.4f} ± {errors[person][field][value]:.4f}")
+                else:
+                    print(f"    {value}: {p:.4f}")
+
+
+def compute(people, method="exact", processes=None):
+    """
+    Compute every person's gene and trait distribution with `method`, one
+    of METHODS. `processes` is only used by sampling.
+
+    Return (probabilities, errors, rhat) like sample_probabilities; errors
+    and rhat are None for the other, exact methods.
+    """
+    if method == "exact":
+        return infer(people), None, None
+    elif method == "vectorized":
+        return enumerate_vectorized(people), None, None
+    elif method == "sample":
+        return sample_probabilities(people, processes=processes)
+    else:
+        return enumerate_probabilities(people), None, None
+
+
+def empty_probabilities(people):
+    """
+    Return a probabilities dict with every gene and trait value at 0.
+    """
+    return {
         person: {
             "gene": {
                 2: 0,
@@ -60,38 +126,114 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+def enumerate_probabilities(people):
+    """
+    Compute every person's gene and trait distribution by summing the
+    joint probability of every possible assignment.
+    """
+    # Keep track of gene and trait probabilities for each person
+    probabilities = empty_probabilities(people)
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+    # Loop over every assignment that fits the evidence and could happen
+    for one_gene, two_genes, have_trait, p in assignments(people):
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+        # Update probabilities with new joint probability
+        update(probabilities, one_gene, two_genes, have_trait, p)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
+
+
+def assignments(people):
+    """
+    Lazily yield (one_gene, two_genes, have_trait, p) for every assignment
+    of genes and traits that agrees with the known traits and has a joint
+    probability p above 0.
+
+    People are assigned parents first, so each choice multiplies the partial
+    joint probability by one person's gene and trait chances, and a branch
+    is dropped as soon as that reaches 0. The same three sets are updated
+    in place and yielded every time, so use them before asking for the next.
+    """
+    order = pedigree_order(people)
+    inherit = inheritance_table()
+    one_gene = set()
+    two_genes = set()
+    have_trait = set()
+    genes = {}
+
+    def walk(i, p):
+        if i == len(order):
+            yield one_gene, two_genes, have_trait, p
+            return
+
+        person = order[i]
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        trait = people[person]["trait"]
+        # known traits only have one option
+        traits = (True, False) if trait is None else (trait,)
+
+        for geneAmount in GENES:
+            if mother and father:
+                geneProb = inherit[geneAmount][genes[mother]][genes[father]]
+            else:
+                geneProb = PROBS["gene"][geneAmount]
+            if not geneProb:
+                continue
+
+            genes[person] = geneAmount
+            if geneAmount == 1:
+                one_gene.add(person)
+            elif geneAmount == 2:
+                two_genes.add(person)
+
+            for value in traits:
+                partial = p * geneProb * PROBS["trait"][geneAmount][value]
+                if not partial:
+                    continue
+                if value:
+                    have_trait.add(person)
+                yield from walk(i + 1, partial)
+                have_trait.discard(person)
+
+            one_gene.discard(person)
+            two_genes.discard(person)
+
+    yield from walk(0, 1)
+
+
+def pedigree_order(people):
+    """
+    Return the names in `people` ordered so that everyone comes after
+    their parents.
+    """
+    order = []
+    placed = set()
+
+    def place(person):
+        # walk up to the oldest unplaced ancestor first
+        stack = [person]
+        while stack:
+            current = stack[-1]
+            if current in placed:
+                stack.pop()
+                continue
+            parents = [parent for parent in (people[current]["mother"],
+                                             people[current]["father"])
+                       if parent and parent not in placed]
+            if parents:
+                stack.extend(parents)
+            else:
+                placed.add(current)
+                order.append(current)
+                stack.pop()
 
-    # Print results
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        place(person)
+    return order
 
 
 def load_data(filename):
@@ -176,46 +318,58 @@ def probGene(people, one_gene, two_genes, have_trait, person, geneAmount):
     geneProb = 1
 
     if mother and father:
-        # chance mom passes gene on
+        # how many genes mom has
         if mother in one_gene:
-            # chance you get bad gene or reg gene and mutates 
-            momGene = 0.50 + PROBS["mutation"]
+            momGene = 1
         elif mother in two_genes:
-            # you get bad gene but might mutate to normal        
-            momGene = 1 - PROBS["mutation"]
-        else:  # no bad gene but might mutate
-            momGene = PROBS["mutation"]
-
-        # chance dad passes gene on
+            momGene = 2
+        # how many genes dad has
         if father in one_gene:
-            # chance you get bad gene or reg gene and mutates 
-            dadGene = 0.50 + PROBS["mutation"]
+            dadGene = 1
         elif father in two_genes:
-            # you get bad gene but might mutate to normal
-            dadGene = 1 - PROBS["mutation"]
-        else:  # no bad gene but might mutate
-            dadGene = PROBS["mutation"]
+            dadGene = 2
+        geneProb = childGene(momGene, dadGene, geneAmount)
+    else:  # no mom or dad given, just use unconditional values
+        geneProb = PROBS["gene"][geneAmount]
 
+    return geneProb
+
+def passGene(parentGenes):
+    """returns the chance a parent with x amounts of gene passes it on"""
+    if parentGenes == 1:
+        # chance you get bad gene or reg gene and mutates
+        return 0.50 + PROBS["mutation"]
+    elif parentGenes == 2:
+        # you get bad gene but might mutate to normal
+        return 1 - PROBS["mutation"]
+    else:  # no bad gene but might mutate
+        return PROBS["mutation"]
+
+@functools.lru_cache(maxsize=None)
+def inheritance_table():
+    """returns table[child][mom][dad], the chance a child of parents with mom and dad
+    amounts of gene has child amounts, worked out once per process (PROBS is fixed)"""
+    return tuple(
+        tuple(
+            tuple(childGene(momGenes, dadGenes, geneAmount) for dadGenes in GENES)
+            for momGenes in GENES
+        )
+        for geneAmount in GENES
+    )
+
+def childGene(momGenes, dadGenes, geneAmount):
+    """returns the probability a child of parents with these genes has x amounts of gene"""
+    momGene = passGene(momGenes)
+    dadGene = passGene(dadGenes)
     if geneAmount == 0:
-        if mother and father:
-            # the chance that they both don't have the gene
-            geneProb = (1 - momGene) * (1 - dadGene)
-        else:  # no mom or dad given, just use unconditional values
-            geneProb = PROBS["gene"][0]
+        # the chance that they both don't have the gene
+        return (1 - momGene) * (1 - dadGene)
     elif geneAmount == 1:
-        if mother and father:
-            # chance one passes it down
-            geneProb = (1 - momGene) * dadGene + momGene * (1 - dadGene)
-        else:  # no mom or dad given, just use unconditional values
-            geneProb = PROBS["gene"][1]
-    elif geneAmount == 2:
-        if mother and father:
-            # chance they both have it
-            geneProb = momGene * dadGene
-        else:  # no mom or dad given, just use unconditional values
-            geneProb = PROBS["gene"][2]
-
-    return geneProb
+        # chance one passes it down
+        return (1 - momGene) * dadGene + momGene * (1 - dadGene)
+    else:
+        # chance they both have it
+        return momGene * dadGene
 
 def probTrait(person, have_trait, geneAmount):
     """returns either the probability they have the trait or don't depending on gene"""
@@ -270,5 +424,479 @@ def normalize(probabilities):
             # update each probability by the normalizing factor
             person[name] = {key: percent * nFactor for key, percent in pDist.items()}
 
+
+def enumerate_vectorized(people):
+    """
+    Compute the same distributions as enumerate_probabilities, scoring
+    batches of gene assignments at once with NumPy.
+
+    Assignment k gives person i the gene amount in the ith base 3 digit of k.
+    Traits aren't enumerated: a known trait multiplies the joint probability
+    by its chance, and an unknown one sums to 1, so each person's chance of
+    the trait can be added up straight from their gene amount.
+    """
+    import numpy as np
+
+    names = list(people)
+    n = len(names)
+    index = {name: i for i, name in enumerate(names)}
+
+    # per person table of P(gene | mom's genes, dad's genes) * P(known trait | gene),
+    # founders just ignore the parent axes
+    geneTable = np.zeros((n, 3, 3, 3))
+    # parent columns to look up, founders point at themselves
+    moms = np.arange(n)
+    dads = np.arange(n)
+    # chance of having the trait for each gene amount
+    traitTrue = np.array([PROBS["trait"][genes][True] for genes in GENES])
+    # whether each person's trait is known, and if so its value
+    known = np.array([people[name]["trait"] is not None for name in names])
+    observed = np.array([bool(people[name]["trait"]) for name in names])
+
+    inherit = np.array(inheritance_table())
+    for i, name in enumerate(names):
+        trait = people[name]["trait"]
+        mother, father = people[name]["mother"], people[name]["father"]
+        for genes in GENES:
+            evidence = 1 if trait is None else PROBS["trait"][genes][trait]
+            if mother and father:
+                geneTable[i, genes] = inherit[genes] * evidence
+            else:
+                geneTable[i, genes] = PROBS["gene"][genes] * evidence
+        if mother and father:
+            moms[i] = index[mother]
+            dads[i] = index[father]
+
+    geneTotals = np.zeros((n, 3))
+    traitTotals = np.zeros((n, 2))
+    total = 0.0
+    everyone = np.arange(n)
+    powers = 3 ** np.arange(n, dtype=np.int64)
+
+    for start in range(0, 3 ** n, BATCH_SIZE):
+        assignments = np.arange(start, min(start + BATCH_SIZE, 3 ** n), dtype=np.int64)
+        # genes[b, i] = gene amount of person i in assignment b
+        genes = (assignments[:, None] // powers) % 3
+
+        p = np.prod(geneTable[everyone, genes, genes[:, moms], genes[:, dads]], axis=1)
+
+        total += p.sum()
+        np.add.at(geneTotals, (np.broadcast_to(everyone, genes.shape), genes), p[:, None])
+        # unknown traits: P(trait | gene), known traits: all or nothing
+        hasTrait = np.where(known, observed, traitTrue[genes])
+        traitTotals[:, 0] += p @ hasTrait
+        traitTotals[:, 1] += p @ (1 - hasTrait)
+
+    # total can't be 0
+    if not total:
+        raise Exception("probability is 0")
+
+    probabilities = empty_probabilities(people)
+    for i, name in enumerate(names):
+        for genes in GENES:
+            probabilities[name]["gene"][genes] = float(geneTotals[i, genes] / total)
+        probabilities[name]["trait"][True] = float(traitTotals[i, 0] / total)
+        probabilities[name]["trait"][False] = float(traitTotals[i, 1] / total)
+    return probabilities
+
+
+def sample_probabilities(people, samples=SAMPLES, chains=CHAINS,
+                         processes=None, seed=None):
+    """
+    Estimate every person's gene and trait distribution with Gibbs sampling,
+    for families too big for exact inference.
+
+    Runs `chains` independent chains of `samples` sweeps (after a tenth as
+    many burn-in sweeps) on a pool of `processes` workers, each chain with
+    its own random seed derived from `seed`. Every sweep resamples each
+    person's gene given their parents, their children and their trait, and
+    records that conditional distribution rather than just the sampled value.
+
+    Return (probabilities, errors, rhat): probabilities in the same structure
+    normalize produces, standard errors in the same structure (from batch
+    means, so they account for correlation between sweeps), and each person's
+    largest Gelman-Rubin R-hat across gene amounts (near 1 once converged).
+    """
+    network = gibbs_network(people)
+    seeds = random.Random(seed).sample(range(2 ** 32), chains)
+    jobs = [(network, samples, chainSeed) for chainSeed in seeds]
+
+    if chains == 1 or processes == 1:
+        results = [gibbs_chain(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(gibbs_chain, jobs)
+
+    names = network["names"]
+    probabilities = empty_probabilities(people)
+    errors = empty_probabilities(people)
+    rhat = {}
+
+    for i, person in enumerate(names):
+        trait = people[person]["trait"]
+        # batch means of this person's gene distribution from every chain
+        batches = [batch[i] for batchMeans, _, _ in results for batch in batchMeans]
+
+        def summarize(values):
+            mean = sum(values) / len(values)
+            if len(values) < 2:
+                return mean, 0.0
+            variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+            return mean, (variance / len(values)) ** 0.5
+
+        for genes in GENES:
+            mean, error = summarize([batch[genes] for batch in batches])
+            probabilities[person]["gene"][genes] = mean
+            errors[person]["gene"][genes] = error
+
+        for value in (True, False):
+            if trait is not None:
+                # known traits are certain
+                probabilities[person]["trait"][value] = 1 if value == trait else 0
+                continue
+            mean, error = summarize([
+                sum(batch[genes] * PROBS["trait"][genes][value] for genes in GENES)
+                for batch in batches
+            ])
+            probabilities[person]["trait"][value] = mean
+            errors[person]["trait"][value] = error
+
+        rhat[person] = max(
+            gelman_rubin([(means[i][genes], squares[i][genes])
+                          for _, means, squares in results], samples)
+            for genes in GENES
+        )
+
+    return probabilities, errors, rhat
+
+
+def gibbs_network(people):
+    """
+    Return the lookup tables gibbs_chain needs, with people as indexes:
+    names, parents (pair of indexes or None), children (list of
+    (child, other parent) pairs), prior (chance of each gene amount for
+    people without parents, times the chance of their known trait),
+    evidence (chance of the known trait for each gene amount) and
+    inherit[child][mom][dad] (chance of the child's gene amount).
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    parents = []
+    children = [[] for _ in names]
+    evidence = []
+
+    for i, name in enumerate(names):
+        trait = people[name]["trait"]
+        evidence.append([1 if trait is None else PROBS["trait"][genes][trait]
+                         for genes in GENES])
+        mother, father = people[name]["mother"], people[name]["father"]
+        if mother and father:
+            mom, dad = index[mother], index[father]
+            parents.append((mom, dad))
+            children[mom].append((i, dad))
+            children[dad].append((i, mom))
+        else:
+            parents.append(None)
+
+    return {
+        "names": names,
+        "parents": parents,
+        "children": children,
+        "evidence": evidence,
+        "prior": [PROBS["gene"][genes] for genes in GENES],
+        "inherit": inheritance_table()
+    }
+
+
+def gibbs_chain(job):
+    """
+    Run one Gibbs sampling chain. `job` is (network, samples, seed).
+
+    Return (batchMeans, means, squares): the average gene distribution of
+    each person over each of SAMPLE_BATCHES stretches of sweeps, and the
+    mean and mean square of it over all kept sweeps.
+    """
+    network, samples, seed = job
+    rng = random.Random(seed)
+    parents = network["parents"]
+    children = network["children"]
+    evidence = network["evidence"]
+    prior = network["prior"]
+    inherit = network["inherit"]
+    n = len(parents)
+
+    # start everyone off with a gene amount drawn from the prior
+    genes = [rng.choices(GENES, prior)[0] for _ in range(n)]
+
+    batchSize = max(samples // SAMPLE_BATCHES, 1)
+    batchMeans = []
+    batchTotals = [[0.0, 0.0, 0.0] for _ in range(n)]
+    totals = [[0.0, 0.0, 0.0] for _ in range(n)]
+    squares = [[0.0, 0.0, 0.0] for _ in range(n)]
+    burnIn = samples // 10
+
+    for sweep in range(burnIn + samples):
+        keep = sweep >= burnIn
+        for i in range(n):
+            # chance of each gene amount for i given everyone else
+            weights = []
+            for amount in GENES:
+                if parents[i]:
+                    mom, dad = parents[i]
+                    w = inherit[amount][genes[mom]][genes[dad]]
+                else:
+                    w = prior[amount]
+                w *= evidence[i][amount]
+                for child, other in children[i]:
+                    if parents[child][0] == i:
+                        w *= inherit[genes[child]][amount][genes[other]]
+                    else:
+                        w *= inherit[genes[child]][genes[other]][amount]
+                weights.append(w)
+            total = weights[0] + weights[1] + weights[2]
+
+            r = rng.random() * total
+            genes[i] = 0 if r < weights[0] else 1 if r < weights[0] + weights[1] else 2
+
+            if keep:
+                for amount in GENES:
+                    p = weights[amount] / total
+                    batchTotals[i][amount] += p
+                    totals[i][amount] += p
+                    squares[i][amount] += p * p
+
+        if keep and (sweep - burnIn + 1) % batchSize == 0 and len(batchMeans) < SAMPLE_BATCHES:
+            batchMeans.append([[t / batchSize for t in person] for person in batchTotals])
+            batchTotals = [[0.0, 0.0, 0.0] for _ in range(n)]
+
+    means = [[t / samples for t in person] for person in totals]
+    squares = [[s / samples for s in person] for person in squares]
+    return batchMeans, means, squares
+
+
+def gelman_rubin(chains, samples):
+    """
+    Return the Gelman-Rubin R-hat for one quantity given each chain's
+    (mean, mean square) over `samples` sweeps.
+    """
+    if len(chains) < 2 or samples < 2:
+        return 1.0
+    means = [mean for mean, _ in chains]
+    grandMean = sum(means) / len(means)
+    # spread between chains and average spread within them
+    between = samples * sum((m - grandMean) ** 2 for m in means) / (len(chains) - 1)
+    within = sum((square - mean ** 2) * samples / (samples - 1)
+                 for mean, square in chains) / len(chains)
+    if within <= 0:
+        return 1.0
+    pooled = (samples - 1) / samples * within + between / samples
+    return (pooled / within) ** 0.5
+
+
+def infer(people):
+    """
+    Compute every person's gene and trait distribution exactly, without
+    enumerating every assignment.
+
+    The family is a Bayesian network: each person's gene depends on their
+    parents' genes and their trait depends on their gene. Traits are leaves,
+    so known traits become evidence on the gene and unknown ones can be
+    summed out. The gene variables are eliminated one at a time, which
+    builds a clique tree; passing messages up and back down that tree gives
+    every person's gene distribution at once. For pedigrees without loops
+    the cliques stay at most a child and their parents, so the work grows
+    linearly with the size of the family.
+
+    Returns the same structure as enumerate_probabilities.
+    """
+    factors = person_factors(people)
+    order = elimination_order(factors)
+
+    # eliminating a variable makes a clique out of every factor it is the
+    # first variable eliminated from, plus the messages left over by earlier
+    # eliminations; its own leftover goes to the next variable eliminated
+    position = {var: i for i, var in enumerate(order)}
+    cliques = {var: [] for var in order}
+    children = {var: [] for var in order}
+    scopes = {var: set() for var in order}
+    for f in factors:
+        home = min(f[0], key=lambda v: position[v])
+        cliques[home].append(f)
+        scopes[home].update(f[0])
+    for var in order:
+        rest = scopes[var] - {var}
+        if rest:
+            parent = min(rest, key=lambda v: position[v])
+            children[parent].append(var)
+            scopes[parent].update(rest)
+
+    # upward pass, in elimination order
+    up = {}
+    for var in order:
+        messages = [up[child] for child in children[var]]
+        up[var] = rescale(sum_out(multiply(cliques[var] + messages), var))
+
+    # downward pass, in reverse elimination order
+    down = {}
+    marginals = {}
+    for var in reversed(order):
+        incoming = [down[var]] if var in down else []
+        belief = multiply(cliques[var] + incoming + [up[child] for child in children[var]])
+        marginals[var] = marginal(belief, var)
+        for child in children[var]:
+            # everything this clique knows except what the child told it
+            others = [up[c] for c in children[var] if c != child]
+            message = multiply(cliques[var] + incoming + others)
+            separator = set(up[child][0])
+            for v in message[0]:
+                if v not in separator:
+                    message = sum_out(message, v)
+            down[child] = rescale(message)
+
+    probabilities = empty_probabilities(people)
+    for person in people:
+        total = sum(marginals[person].values())
+        # total can't be 0
+        if not total:
+            raise Exception("probability is 0")
+        for genes in GENES:
+            probabilities[person]["gene"][genes] = marginals[person][genes] / total
+
+        trait = people[person]["trait"]
+        if trait is not None:
+            # known traits are certain
+            probabilities[person]["trait"][trait] = 1
+            probabilities[person]["trait"][not trait] = 0
+        else:
+            for value in (True, False):
+                probabilities[person]["trait"][value] = sum(
+                    probabilities[person]["gene"][genes] * PROBS["trait"][genes][value]
+                    for genes in GENES
+                )
+    return probabilities
+
+
+def person_factors(people):
+    """
+    Return one factor per person: the chance of their gene given their
+    parents' genes (or the unconditional chance if they have no parents),
+    times the chance of their trait if it's known.
+
+    A factor is a tuple (variables, table) where variables is a tuple of
+    names and table maps each tuple of gene amounts to a probability.
+    """
+    inherit = inheritance_table()
+    factors = []
+    for person, data in people.items():
+        trait = data["trait"]
+
+        def evidence(genes):
+            # unknown traits sum to 1 over both values so they drop out
+            return 1 if trait is None else PROBS["trait"][genes][trait]
+
+        mother, father = data["mother"], data["father"]
+        if mother and father:
+            variables = (person, mother, father)
+            table = {
+                (genes, momGenes, dadGenes):
+                    inherit[genes][momGenes][dadGenes] * evidence(genes)
+                for genes, momGenes, dadGenes in itertools.product(GENES, repeat=3)
+            }
+        else:
+            variables = (person,)
+            table = {(genes,): PROBS["gene"][genes] * evidence(genes) for genes in GENES}
+        factors.append((variables, table))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Return an order to eliminate variables in, greedily picking the variable
+    with the fewest neighbors (ties broken by name) in the graph where
+    variables sharing a factor are connected.
+    """
+    neighbors = {}
+    for variables, _ in factors:
+        for var in variables:
+            neighbors.setdefault(var, set()).update(v for v in variables if v != var)
+
+    # heap of (neighbor count, variable), stale entries are skipped
+    heap = [(len(adjacent), var) for var, adjacent in neighbors.items()]
+    heapq.heapify(heap)
+
+    order = []
+    while heap:
+        degree, var = heapq.heappop(heap)
+        if var not in neighbors or degree != len(neighbors[var]):
+            continue
+        # eliminating var connects all of its neighbors to each other
+        for v in neighbors[var]:
+            neighbors[v].update(neighbors[var] - {v})
+            neighbors[v].discard(var)
+            heapq.heappush(heap, (len(neighbors[v]), v))
+        del neighbors[var]
+        order.append(var)
+    return order
+
+
+def multiply(factors):
+    """
+    Return the product of a list of factors.
+    """
+    variables = []
+    for fVars, _ in factors:
+        for var in fVars:
+            if var not in variables:
+                variables.append(var)
+    variables = tuple(variables)
+
+    table = {}
+    for values in itertools.product(GENES, repeat=len(variables)):
+        assignment = dict(zip(variables, values))
+        p = 1
+        for fVars, fTable in factors:
+            p *= fTable[tuple(assignment[var] for var in fVars)]
+        table[values] = p
+    return variables, table
+
+
+def sum_out(factor, var):
+    """
+    Return `factor` with `var` summed out.
+    """
+    variables, table = factor
+    i = variables.index(var)
+    summed = {}
+    for values, p in table.items():
+        key = values[:i] + values[i + 1:]
+        summed[key] = summed.get(key, 0) + p
+    return variables[:i] + variables[i + 1:], summed
+
+
+def rescale(factor):
+    """
+    Return `factor` scaled to sum to 1. Messages only matter up to a
+    constant, and without this big families underflow to 0.
+    """
+    variables, table = factor
+    total = sum(table.values())
+    if not total:
+        return factor
+    return variables, {values: p / total for values, p in table.items()}
+
+
+def marginal(factor, var):
+    """
+    Return the (unnormalized) distribution of `var` in `factor`
+    as a dict from gene amount to probability.
+    """
+    variables, table = factor
+    i = variables.index(var)
+    dist = {genes: 0 for genes in GENES}
+    for values, p in table.items():
+        dist[values[i]] += p
+    return dist
+
+
 if __name__ == "__main__":
     main()
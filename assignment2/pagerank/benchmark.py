@@ -0,0 +1,212 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import outofcore
+from pagerank import (DAMPING, SOLVERS, crawl_graph, iterate_pagerank,
+                      parallel_sample_pagerank, power_iteration, sample_pagerank)
+
+# Every engine that can be benchmarked
+ENGINES = ["sample", "parallel-sample"] + SOLVERS + ["disk"]
+
+# Tolerance of the reference ranks everything is compared against
+REFERENCE_TOLERANCE = 1e-15
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time PageRank engines on synthetic corpora and measure their error."
+    )
+    parser.add_argument("-n", "--pages", type=int, action="append", default=[],
+                        help="pages in a generated corpus, can be given more than once "
+                             "(default: 1000 and 10000)")
+    parser.add_argument("-a", "--exponent", type=float, default=2.1,
+                        help="power law exponent of links per page and per target (default: 2.1)")
+    parser.add_argument("-d", "--dangling", type=float, default=0.1,
+                        help="fraction of pages without links (default: 0.1)")
+    parser.add_argument("-e", "--engine", action="append", choices=ENGINES, default=[],
+                        help="engine to run, can be given more than once (default: all)")
+    parser.add_argument("-k", "--samples", type=int, default=100000,
+                        help="samples for the sampling engines (default: 100000)")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="seed for generating corpora and sampling (default: 0)")
+    parser.add_argument("-c", "--corpus", help="benchmark this corpus instead of generating any")
+    parser.add_argument("-o", "--output", help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    engines = args.engine or ENGINES
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "damping": DAMPING,
+        "corpora": []
+    }
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.corpus:
+            corpora = [(args.corpus, {"directory": args.corpus})]
+        else:
+            corpora = []
+            for pages in args.pages or [1000, 10000]:
+                directory = os.path.join(scratch, f"corpus{pages}")
+                generate_corpus(directory, pages, args.exponent, args.dangling, args.seed)
+                corpora.append((directory, {
+                    "pages": pages, "exponent": args.exponent,
+                    "dangling": args.dangling, "seed": args.seed
+                }))
+
+        for directory, description in corpora:
+            result = benchmark_corpus(directory, engines, args.samples, args.seed, scratch)
+            result["corpus"] = description
+            results["corpora"].append(result)
+            print_result(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def revision():
+    """
+    Return the git commit being benchmarked, or None outside a checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generate_corpus(directory, pages, exponent, dangling, seed):
+    """
+    Write a corpus of `pages` HTML files to `directory` that crawl can
+    read. Links per page and how often each page is linked to both follow
+    a power law with `exponent`, like the web, and a `dangling` fraction
+    of pages have no links at all.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    # links per page: Zipf distributed, apart from the pages without any
+    degrees = np.minimum(rng.zipf(exponent, pages), pages - 1)
+    degrees[rng.random(pages) < dangling] = 0
+    # how popular each page is as a link target, in a random order
+    popularity = 1 / np.arange(1, pages + 1) ** (exponent - 1)
+    popularity = rng.permutation(popularity / popularity.sum())
+
+    draws = rng.choice(pages, size=2 * degrees.sum(), p=popularity)
+    used = 0
+    for page, degree in enumerate(degrees):
+        candidates = draws[used:used + 2 * degree]
+        used += 2 * degree
+        links = [link for link in dict.fromkeys(candidates.tolist()) if link != page]
+        write_page(directory, page, links[:degree])
+
+
+def write_page(directory, page, links):
+    """
+    Write page number `page` to `directory`, linking to pages `links`.
+    """
+    items = "".join(
+        f'            <li><a href="{link}.html">{link}</a></li>\n' for link in links
+    )
+    with open(os.path.join(directory, f"{page}.html"), "w") as f:
+        f.write(
+            "<!DOCTYPE html>\n"
+            "<html lang=\"en\">\n"
+            f"    <head>\n        <title>{page}</title>\n    </head>\n"
+            f"    <body>\n        <h1>{page}</h1>\n\n"
+            "        <div>Links:</div>\n"
+            f"        <ul>\n{items}        </ul>\n"
+            "    </body>\n"
+            "</html>\n"
+        )
+
+
+def benchmark_corpus(directory, engines, samples, seed, scratch):
+    """
+    Crawl the corpus in `directory`, compute reference ranks and run each
+    of `engines` on it. Return a dict with the corpus size and a result
+    per engine.
+    """
+    start = time.perf_counter()
+    graph = crawl_graph(directory)
+    crawlTime = time.perf_counter() - start
+    reference = power_iteration(graph, DAMPING, REFERENCE_TOLERANCE, 100000)
+
+    runs = {}
+    for engine in engines:
+        runs[engine] = run_engine(engine, graph, directory, samples, seed, scratch, reference)
+
+    return {
+        "pages": len(graph),
+        "links": int(graph.outDegree.sum()),
+        "dangling": int(graph.dangling.sum()),
+        "crawl_seconds": crawlTime,
+        "engines": runs
+    }
+
+
+def run_engine(engine, graph, directory, samples, seed, scratch, reference):
+    """
+    Run one engine on `graph` and return its wall time, peak memory,
+    iterations (None for sampling) and L1 error against `reference`.
+
+    Memory is the peak traced by tracemalloc in this process, so it leaves
+    out the workers of parallel-sample.
+    """
+    residuals = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    if engine == "sample":
+        ranks = sample_pagerank(graph, DAMPING, samples, seed=seed)
+    elif engine == "parallel-sample":
+        ranks, _ = parallel_sample_pagerank(graph, DAMPING, samples, seed=seed)
+    elif engine == "disk":
+        # writing the edge arrays counts, it's part of using this engine
+        edges = tempfile.mkdtemp(dir=scratch)
+        outofcore.write_edges(directory, edges)
+        values = outofcore.disk_pagerank(edges, DAMPING, residuals=residuals)
+        ranks = dict(zip(outofcore.load_pages(edges), values.tolist()))
+    else:
+        ranks = iterate_pagerank(graph, DAMPING, method=engine, residuals=residuals)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    values = np.array([ranks[page] for page in graph.pages])
+    return {
+        "seconds": elapsed,
+        "peak_mb": peak / 2 ** 20,
+        "iterations": len(residuals) if residuals else None,
+        "l1_error": float(np.abs(values - reference).sum()),
+        "residuals": [float(residual) for residual in residuals]
+    }
+
+
+def print_result(result):
+    """
+    Print the results for one corpus.
+    """
+    print(f"{result['pages']} pages, {result['links']} links, "
+          f"{result['dangling']} without links (crawled in {result['crawl_seconds']:.2f}s)")
+    for engine, run in result["engines"].items():
+        iterations = "-" if run["iterations"] is None else run["iterations"]
+        print(f"  {engine:<16} {run['seconds']:8.3f}s {run['peak_mb']:8.1f} MB "
+              f"{iterations:>6} iterations  L1 error {run['l1_error']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from pagerank import DAMPING, Graph, power_iteration, read_links
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python incremental.py corpus state")
+    ranks, report = update(sys.argv[1], sys.argv[2], DAMPING)
+    print(f"Added {report['added']}, removed {report['removed']}, "
+          f"changed {report['changed']} of {report['pages']} pages")
+    print(f"PageRank Results from Iteration ({report['iterations']} iterations)")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f}")
+
+
+def update(directory, state_file, damping_factor=DAMPING):
+    """
+    Bring the PageRank of the corpus in `directory` up to date, using the
+    graph and ranks saved in `state_file` by the last run (if there is one)
+    and saving the new ones there afterwards.
+
+    A file is re-read only if its modification time or size changed and its
+    contents hash differently. Only those pages' links are re-crawled, and
+    power iteration starts from the last ranks, so a mostly unchanged corpus
+    converges in a few iterations.
+
+    Return (ranks, report) where report counts the pages added, removed,
+    changed and in total, and the iterations it took.
+    """
+    old = load_state(state_file)
+    oldPages = old["pages"]
+    oldIndex = {page: i for i, page in enumerate(oldPages)}
+
+    # which files need to be read again
+    entries = sorted(
+        (entry.name, entry) for entry in os.scandir(directory)
+        if entry.name.endswith(".html")
+    )
+    pages = [page for page, _ in entries]
+    fingerprints = {}
+    changed = []
+    for page, entry in entries:
+        stat = entry.stat()
+        previous = old["fingerprints"].get(page)
+        if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+            fingerprints[page] = previous
+            continue
+        digest = file_hash(entry.path)
+        fingerprints[page] = (stat.st_mtime_ns, stat.st_size, digest)
+        if not previous or previous[2] != digest:
+            changed.append(page)
+
+    # links of re-read pages, by name (including ones outside the corpus)
+    paths = [os.path.join(directory, page) for page in changed]
+    fresh = dict(zip(changed, read_links(paths)))
+
+    # new number of each old page (-1 if it's gone); both lists are
+    # sorted, so this keeps the order of every row
+    n = len(pages)
+    oldToNew = np.full(len(oldPages), -1, dtype=np.int64)
+    if oldPages and pages:
+        names = np.array(pages)
+        found = np.minimum(np.searchsorted(names, oldPages), n - 1)
+        kept = names[found] == np.array(oldPages)
+        oldToNew[kept] = found[kept]
+    added = set(pages) - set(oldIndex)
+    removed = set(oldIndex) - set(pages)
+
+    # unchanged pages go through names only if a page they linked to is
+    # gone, or a link saved as outside the corpus now isn't
+    oldSources = np.repeat(np.arange(len(oldPages)), np.diff(old["indptr"]))
+    oldTargets = oldToNew[old["indices"]]
+    byName = set(fresh)
+    if removed:
+        byName.update(oldPages[j] for j in np.unique(oldSources[oldTargets < 0]))
+    if added:
+        byName.update(page for page, links in old["outside"].items()
+                      if not added.isdisjoint(links))
+
+    # rows kept as they were, renumbered all at once
+    keep = oldToNew >= 0
+    for page in byName:
+        if page in oldIndex:
+            keep[oldIndex[page]] = False
+    keptLinks = keep[oldSources]
+    linkFrom = [oldToNew[oldSources[keptLinks]]]
+    linkTo = [oldTargets[keptLinks]]
+    outside = {page: links for page, links in old["outside"].items()
+               if page not in byName and page not in removed}
+
+    # the rest, from their links by name
+    index = {page: i for i, page in enumerate(pages)}
+    for page in byName:
+        if page not in index:
+            continue
+        i = index[page]
+        if page in fresh:
+            links = fresh[page]
+        else:
+            j = oldIndex[page]
+            links = {oldPages[k] for k in old["indices"][old["indptr"][j]:old["indptr"][j + 1]]}
+            links.update(old["outside"].get(page, ()))
+        linked = sorted({index[link] for link in links if link in index} - {i})
+        linkFrom.append(np.full(len(linked), i, dtype=np.int64))
+        linkTo.append(np.array(linked, dtype=np.int64))
+        missing = sorted(link for link in links if link not in index and link != page)
+        if missing:
+            outside[page] = missing
+
+    # every row's links end up together, each row still in order
+    linkFrom = np.concatenate(linkFrom)
+    linkTo = np.concatenate(linkTo)
+    order = np.argsort(linkFrom, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(linkFrom, minlength=n), out=indptr[1:])
+    graph = Graph(pages, indptr, linkTo[order])
+
+    # warm start from the last ranks, new pages get an even share
+    start = np.full(n, 1 / max(n, 1))
+    stayed = oldToNew >= 0
+    start[oldToNew[stayed]] = old["ranks"][stayed]
+    start /= start.sum()
+
+    residuals = []
+    ranks = power_iteration(graph, damping_factor, start=start, residuals=residuals)
+
+    save_state(state_file, {
+        "pages": pages,
+        "indptr": graph.indptr,
+        "indices": graph.indices,
+        "outside": outside,
+        "fingerprints": fingerprints,
+        "ranks": ranks
+    })
+
+    report = {
+        "pages": n,
+        "added": len(added),
+        "removed": len(removed),
+        "changed": len(changed),
+        "iterations": len(residuals)
+    }
+    return graph.to_dict(ranks), report
+
+
+def file_hash(path):
+    """
+    Return a hash of a file's contents.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_state(state_file):
+    """
+    Return the state saved by the last update, or an empty one.
+    """
+    if not os.path.exists(state_file):
+        return {
+            "pages": [],
+            "indptr": np.zeros(1, dtype=np.int64),
+            "indices": np.zeros(0, dtype=np.int64),
+            "outside": {},
+            "fingerprints": {},
+            "ranks": np.zeros(0)
+        }
+    with open(state_file, "rb") as f:
+        return pickle.load(f)
+
+
+def save_state(state_file, state):
+    """
+    Save state for the next update, replacing the old file only once
+    the new one is completely written.
+    """
+    temporary = state_file + ".tmp"
+    with open(temporary, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, state_file)
+
+
+if __name__ == "__main__":
+    main()
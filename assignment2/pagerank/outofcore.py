@@ -0,0 +1,217 @@
+import hashlib
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from pagerank import DAMPING, MAX_ITERATIONS, TOLERANCE, read_links
+
+# Pages per block: edges are bucketed and streamed this many
+# destination pages at a time
+EDGE_BLOCK = 1 << 20
+
+# Links held in memory while crawling before they're written to buckets
+EDGE_BUFFER = 1 << 22
+
+# Written by write_edges once everything else is, so an interrupted run
+# isn't mistaken for a finished one. It holds the corpus the edges came
+# from, so they're only reused for that corpus as it was.
+COMPLETE = "complete"
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python outofcore.py corpus edges")
+    corpus, edges = sys.argv[1:]
+    if not edges_match(corpus, edges):
+        write_edges(corpus, edges)
+    residuals = []
+    ranks = disk_pagerank(edges, DAMPING, residuals=residuals)
+    print(f"PageRank Results from Iteration ({len(residuals)} iterations)")
+    for page, rank in sorted(zip(load_pages(edges), ranks.tolist())):
+        print(f"  {page}: {rank:.4f}")
+
+
+def write_edges(directory, edges, processes=None):
+    """
+    Crawl the HTML pages in `directory` into memory-mapped edge arrays in
+    the directory `edges`, without ever holding the whole link graph:
+
+        pages.txt       page names, one per line, in page number order
+        degree.npy      number of links out of each page
+        inptr.npy       links into page j are sources[inptr[j]:inptr[j + 1]]
+        sources.npy     page each link comes from, sorted by destination
+        complete        the corpus and its corpus_fingerprint, written last
+
+    Links are written to one bucket file per EDGE_BLOCK destination pages
+    as they're found, then each bucket is sorted on its own.
+    """
+    os.makedirs(edges, exist_ok=True)
+    complete = os.path.join(edges, COMPLETE)
+    if os.path.exists(complete):
+        os.remove(complete)
+    pages = sorted(
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    )
+    with open(os.path.join(edges, "pages.txt"), "w") as f:
+        f.writelines(page + "\n" for page in pages)
+
+    n = len(pages)
+    index = {page: i for i, page in enumerate(pages)}
+    dtype = np.int32 if n < 2 ** 31 else np.int64
+    buckets = os.path.join(edges, "buckets")
+    # buckets are appended to, so drop any left by an interrupted run
+    shutil.rmtree(buckets, ignore_errors=True)
+    os.makedirs(buckets)
+    bucketFiles = [os.path.join(buckets, f"{b}.bin")
+                   for b in range(-(-n // EDGE_BLOCK))]
+
+    degree = np.zeros(n, dtype=dtype)
+    pending = []
+    count = 0
+    paths = [os.path.join(directory, page) for page in pages]
+    for i, links in enumerate(read_links(paths, processes)):
+        # only links to other pages in the corpus
+        linked = {index[link] for link in links if link in index}
+        linked.discard(i)
+        degree[i] = len(linked)
+        if linked:
+            pending.append((np.fromiter(linked, dtype, len(linked)), i))
+            count += len(linked)
+        if count >= EDGE_BUFFER:
+            flush_edges(pending, bucketFiles, dtype)
+            pending = []
+            count = 0
+    flush_edges(pending, bucketFiles, dtype)
+    np.save(os.path.join(edges, "degree.npy"), degree)
+
+    # sort each bucket by destination into one sources array
+    total = sum(os.path.getsize(bucket) for bucket in bucketFiles if os.path.exists(bucket))
+    total //= 2 * np.dtype(dtype).itemsize
+    sources = np.lib.format.open_memmap(os.path.join(edges, "sources.npy"), mode="w+",
+                                        dtype=dtype, shape=(total,))
+    inptr = np.zeros(n + 1, dtype=np.int64)
+    written = 0
+    for b, bucket in enumerate(bucketFiles):
+        first = b * EDGE_BLOCK
+        last = min(first + EDGE_BLOCK, n)
+        if os.path.exists(bucket):
+            pairs = np.fromfile(bucket, dtype=dtype).reshape(-1, 2)
+        else:
+            pairs = np.zeros((0, 2), dtype=dtype)
+        order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+        sources[written:written + len(pairs)] = pairs[order, 1]
+        counts = np.bincount(pairs[:, 0] - first, minlength=last - first)
+        inptr[first + 1:last + 1] = written + np.cumsum(counts)
+        written += len(pairs)
+    sources.flush()
+    del sources
+    np.save(os.path.join(edges, "inptr.npy"), inptr)
+    shutil.rmtree(buckets)
+    with open(complete, "w") as f:
+        f.write(f"{os.path.abspath(directory)}\n{corpus_fingerprint(directory)}\n")
+
+
+def corpus_fingerprint(directory):
+    """
+    Return a hash of the name, size and modification time of every HTML
+    page in `directory`, which changes if any page is added, removed or
+    edited.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if entry.name.endswith(".html"):
+            stat = entry.stat()
+            digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def edges_match(directory, edges):
+    """
+    Return True if `edges` holds a finished write_edges of the corpus in
+    `directory`, unchanged since.
+    """
+    try:
+        with open(os.path.join(edges, COMPLETE)) as f:
+            saved = f.read().splitlines()
+    except FileNotFoundError:
+        return False
+    return saved == [os.path.abspath(directory), corpus_fingerprint(directory)]
+
+
+def flush_edges(pending, bucketFiles, dtype):
+    """
+    Append pending (destinations, source) links to the bucket file of
+    each destination, as (destination, source) pairs.
+    """
+    if not pending:
+        return
+    destinations = np.concatenate([linked for linked, _ in pending])
+    sources = np.repeat(np.array([i for _, i in pending], dtype=dtype),
+                        [len(linked) for linked, _ in pending])
+    pairs = np.column_stack([destinations, sources])
+    bucket = destinations // EDGE_BLOCK
+    order = np.argsort(bucket, kind="stable")
+    pairs = pairs[order]
+    bounds = np.searchsorted(bucket[order], np.arange(len(bucketFiles) + 1))
+    for b, bucketFile in enumerate(bucketFiles):
+        if bounds[b] < bounds[b + 1]:
+            with open(bucketFile, "ab") as f:
+                pairs[bounds[b]:bounds[b + 1]].tofile(f)
+
+
+def load_pages(edges):
+    """
+    Return the page names saved by write_edges, in page number order.
+    """
+    with open(os.path.join(edges, "pages.txt")) as f:
+        return f.read().splitlines()
+
+
+def disk_pagerank(edges, damping_factor, tolerance=TOLERANCE,
+                  max_iterations=MAX_ITERATIONS, residuals=None):
+    """
+    Return an array of PageRank values for the graph saved by write_edges,
+    by power iteration that reads the links one block of EDGE_BLOCK
+    destination pages at a time, so only vectors of per-page values are
+    kept in memory.
+
+    If `residuals` is a list, each round's total change is appended to it.
+    """
+    degree = np.load(os.path.join(edges, "degree.npy"))
+    inptr = np.load(os.path.join(edges, "inptr.npy"), mmap_mode="r")
+    sources = np.load(os.path.join(edges, "sources.npy"), mmap_mode="r")
+    n = len(degree)
+    dangling = degree == 0
+    # how much of a page's rank goes down each of its links
+    perLink = damping_factor / np.maximum(degree, 1)
+
+    # first assume chances to get to each webpage is equal
+    ranks = np.full(n, 1 / n)
+    for _ in range(max_iterations):
+        shares = ranks * perLink
+        # random jumps plus the rank of pages without links, spread evenly
+        spread = (1 - damping_factor + damping_factor * ranks[dangling].sum()) / n
+        newRanks = np.empty(n)
+        for first in range(0, n, EDGE_BLOCK):
+            last = min(first + EDGE_BLOCK, n)
+            bounds = np.asarray(inptr[first:last + 1])
+            linking = np.asarray(sources[bounds[0]:bounds[-1]])
+            targets = np.repeat(np.arange(last - first), np.diff(bounds))
+            newRanks[first:last] = np.bincount(targets, weights=shares[linking],
+                                               minlength=last - first) + spread
+
+        change = np.abs(newRanks - ranks).sum()
+        ranks = newRanks
+        if residuals is not None:
+            residuals.append(change)
+        if change < tolerance:
+            break
+
+    return ranks
+
+
+if __name__ == "__main__":
+    main()
@@ -108,26 +108,73 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
+        # Variables only overlap where they share a cell, so find those
+        # from the cells instead of comparing every pair
+        covering = dict()
+        for var in self.variables:
+            for k, cell in enumerate(var.cells):
+                covering.setdefault(cell, []).append((var, k))
         self.overlaps = dict()
         for v1 in self.variables:
             for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
+                if v1 != v2:
                     self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        for shared in covering.values():
+            for v1, k1 in shared:
+                for v2, k2 in shared:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
+
+        # Neighbors of each variable with their overlap, and how many
+        # there are, so nothing needs to scan every pair of variables
+        # adjacent[var] is a list of (neighbor, (i, j)) where var's ith
+        # character overlaps neighbor's jth character
+        self.adjacent = {var: [] for var in self.variables}
+        for (v1, v2), overlap in self.overlaps.items():
+            if overlap is not None:
+                self.adjacent[v1].append((v2, overlap))
+        self.degree = {var: len(self.adjacent[var]) for var in self.variables}
+
+        # Index vocabulary so sets of words can be bitsets
+        # Words of each length are numbered in order, and a set of words of
+        # one length is an int with bit k set for word k
+        # letter_bits[length, i][letter] is every word of that length with
+        # that letter at position i
+        self.words_by_length = dict()
+        for word in sorted(self.words):
+            self.words_by_length.setdefault(len(word), []).append(word)
+        self.word_index = dict()
+        self.letter_bits = dict()
+        for length, words in self.words_by_length.items():
+            for k, word in enumerate(words):
+                self.word_index[word] = k
+            for i in range(length):
+                found = dict()
+                for k, word in enumerate(words):
+                    found.setdefault(word[i], []).append(k)
+                self.letter_bits[length, i] = {
+                    letter: to_bits(numbers, len(words))
+                    for letter, numbers in found.items()
+                }
+
+    def all_words(self, length):
+        """Return the bitset of every word with `length` letters."""
+        return (1 << len(self.words_by_length.get(length, []))) - 1
+
+    def words_in(self, length, bits):
+        """Return the words of `length` letters in bitset `bits`, in order."""
+        words = self.words_by_length.get(length, [])
+        return [words[k] for k, bit in enumerate(reversed(bin(bits)[2:]))
+                if bit == "1"]
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return set(v for v, _ in self.adjacent[var])
+
+
+def to_bits(numbers, size):
+    """Return the bitset with bits `numbers` set, out of `size` bits."""
+    bits = bytearray((size + 7) // 8)
+    for k in numbers:
+        bits[k >> 3] |= 1 << (k & 7)
+    return int.from_bytes(bits, "little")
@@ -1,19 +1,53 @@
-import sys
+import argparse
+import heapq
+import multiprocessing
+import os
+import queue
+import random
 
 from crossword import *
 
+# Ways the portfolio solvers order a variable's values
+ORDERINGS = ["lcv", "random"]
+
+# Search nodes before the first restart, doubled after each one
+RESTART_NODES = 100
+
+# Seconds the portfolio waits for a result before checking its workers
+POLL_SECONDS = 1
+
+
+class Restart(Exception):
+    """Raised when a search runs out of nodes and should start over."""
+
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, top=None, seed=None, ordering="lcv"):
         """
-        Create new CSP crossword generate.
+        Create new CSP crossword generate. If `top` is given, only that many
+        of a variable's best values are sorted when ordering its domain.
+        With a `seed`, ties between variables and values are broken at
+        random. `ordering` is one of ORDERINGS.
         """
         self.crossword = crossword
+        self.top = top
+        self.random = random.Random(seed) if seed is not None else None
+        self.ordering = ordering
+        # node count to give up at and restart (None = never)
+        self.nodeLimit = None
+        # each domain is a bitset of words (see Crossword.words_in)
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.crossword.all_words(var.length)
             for var in self.crossword.variables
         }
+        # (var, old domain) for every domain change made while searching,
+        # so backtracking can undo them in reverse
+        self.trail = []
+        # words in the assignment being searched
+        self.used = set()
+        # search nodes explored and consistency checks done by solve
+        self.stats = {"nodes": 0, "checks": 0}
 
     def letter_grid(self, assignment):
         """
@@ -91,8 +125,35 @@ class CrosswordCreator():
         """
         self.enforce_node_consistency()
         self.ac3()
+        # nothing before the search needs undoing
+        self.trail = []
+        self.used = set()
+        self.stats = {"nodes": 0, "checks": 0}
         return self.backtrack(dict())
 
+    def solve_restarts(self, limit=RESTART_NODES):
+        """
+        Solve like solve, but start the search over whenever it explores
+        `limit` nodes without finishing, doubling the limit each time.
+        With a seed each restart tries a different order; the limit keeps
+        growing, so the search still finishes either way.
+        """
+        self.stats = {"nodes": 0, "checks": 0, "restarts": 0}
+        self.enforce_node_consistency()
+        if not self.ac3():
+            return None
+        self.trail = []
+        while True:
+            self.used = set()
+            self.nodeLimit = self.stats["nodes"] + limit
+            try:
+                return self.backtrack(dict())
+            except Restart:
+                # back to the domains from before the search
+                self.undo(0)
+                self.stats["restarts"] += 1
+                limit *= 2
+
     def enforce_node_consistency(self):
         """
         Update `self.domains` such that each variable is node-consistent.
@@ -102,8 +163,7 @@ class CrosswordCreator():
         # iterate over each var in cross
         for var in self.crossword.variables:
             # make var's domain only words that are the right length
-            self.domains[var] = {word for word in self.domains[var]
-                                 if var.length == len(word)}
+            self.domains[var] &= self.crossword.all_words(var.length)
 
     def revise(self, x, y):
         """
@@ -116,29 +176,45 @@ class CrosswordCreator():
         """
         # if the two words intersect
         intersect = self.crossword.overlaps[x, y]
-        # words to keep in x after iterating
-        newX = set()
-
-        # only check if intersecting
-        if intersect:
-            # look through each word in x domain
-            for xWord in self.domains[x]:
-                # ensure x word has same letter intersect with y
-                for yWord in self.domains[y]:
-                    if xWord[intersect[0]] == yWord[intersect[1]]:
-                        # else take the word out of domain
-                        newX.add(xWord)
-                        # don't need to keep checking this word
-                        break
+        # not intersecting = any x word works with y
+        if not intersect:
+            return False
+
+        xLetters = self.crossword.letter_bits.get((x.length, intersect[0]), {})
+        yLetters = self.crossword.letter_bits.get((y.length, intersect[1]), {})
+        xDomain = self.domains[x]
+        yDomain = self.domains[y]
+        # x words with a letter at the intersect some y word still has
+        allowed = 0
+        for letter, yWords in yLetters.items():
+            if yDomain & yWords:
+                allowed |= xLetters.get(letter, 0)
+        # words to keep in x
+        newX = xDomain & allowed
 
         # diff set then there was change
-        if newX != self.domains[x]:
-            # only keep working words            
-            self.domains[x] = newX
+        if newX != xDomain:
+            # only keep working words
+            self.set_domain(x, newX)
             return True
         else:  # no change then return false
             return False
 
+    def set_domain(self, var, domain):
+        """
+        Change the domain of `var`, remembering the old one on the trail.
+        """
+        self.trail.append((var, self.domains[var]))
+        self.domains[var] = domain
+
+    def undo(self, mark):
+        """
+        Undo domain changes until the trail is back to `mark` entries long.
+        """
+        while len(self.trail) > mark:
+            var, domain = self.trail.pop()
+            self.domains[var] = domain
+
     def ac3(self, arcs=None):
         """
         Update `self.domains` such that each variable is arc consistent.
@@ -149,11 +225,11 @@ class CrosswordCreator():
         return False if one or more domains end up empty.
         """
         # init arcs if not already done (only intersects are binary cond)
-        if not arcs:
+        if arcs is None:
 
             # only arcs for vars that actually intersect
-            arcs = [arc for arc in list(self.crossword.overlaps.keys())
-                    if self.crossword.overlaps[arc]]
+            arcs = [(x, y) for x in self.crossword.variables
+                    for y, _ in self.crossword.adjacent[x]]
 
         # loop until all arcs consistent
         while arcs:
@@ -170,10 +246,9 @@ class CrosswordCreator():
 
                 """ might cause problems with other arcs intersecting with x
                     so append those to make them consistent"""
-                arcs += [arc for arc in self.crossword.overlaps.keys()
-                         if arc and self.crossword.overlaps[arc]
-                         and currentArc[0] in arc
-                         and arc[1] != currentArc[1]]
+                arcs += [(z, currentArc[0])
+                         for z, _ in self.crossword.adjacent[currentArc[0]]
+                         if z != currentArc[1]]
 
         # after looping: all consistent and still domains = can solve
         return True
@@ -201,7 +276,6 @@ class CrosswordCreator():
         Return True if `assignment` is consistent (i.e., words fit in crossword
         puzzle without conflicting characters); return False otherwise.
         """
-        assignedVars = list(assignment.keys())
         # each solution to var
         for var, word in assignment.items():
 
@@ -210,13 +284,11 @@ class CrosswordCreator():
                 return False
 
             # if intersections conflict
-            overlaps = {key: position for key, position in self.crossword.overlaps.items()
-                if var in key and position}
-            for key, intersectWord in overlaps.items():
+            for neighbor, intersectWord in self.crossword.adjacent[var]:
 
                 # two letters not matching up
-                if key[0] in assignedVars and key[1] in assignedVars:
-                    if assignment[key[0]][intersectWord[0]] != assignment[key[1]][intersectWord[1]]:
+                if neighbor in assignment:
+                    if word[intersectWord[0]] != assignment[neighbor][intersectWord[1]]:
                         return False
 
         # if same word mult times
@@ -225,6 +297,21 @@ class CrosswordCreator():
         else:  # else true
             return True
 
+    def consistent_with(self, assignment, var, word):
+        """
+        Return True if `word` can be added to a consistent `assignment` as
+        the answer for `var`: it fits, isn't used already and agrees with
+        every assigned neighbor. Only checks what the new word touches.
+        """
+        self.stats["checks"] += 1
+        if var.length != len(word) or word in self.used:
+            return False
+        for neighbor, intersectWord in self.crossword.adjacent[var]:
+            if neighbor in assignment:
+                if word[intersectWord[0]] != assignment[neighbor][intersectWord[1]]:
+                    return False
+        return True
+
     def order_domain_values(self, var, assignment):
         """
         Return a list of values in the domain of `var`, in order by
@@ -232,29 +319,41 @@ class CrosswordCreator():
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
         """
+        # for each unassigned var that intersects, how many of its words
+        # have each letter where they meet, so words just look theirs up
+        supports = []
+        for key, intersect in self.crossword.adjacent[var]:
+            if key in assignment:
+                continue
+            letters = self.crossword.letter_bits.get((key.length, intersect[1]), {})
+            counts = {letter: (self.domains[key] & words).bit_count()
+                      for letter, words in letters.items()}
+            supports.append((intersect[0], counts))
+
+        # no heuristic, just any order
+        if self.ordering == "random":
+            words = self.crossword.words_in(var.length, self.domains[var])
+            (self.random or random).shuffle(words)
+            return words
+
         # domain with values n of each var
         newDomain = {}
         # loop through each word var's domain
-        for word in self.domains[var]:
-            # find out how other variables' answers are limited by this word
-            n = 0
-            # each var
-            for key, words in self.domains.items():
-                # dont compare the same var to itself
-                if key == var:
-                    continue
-
-                intersect = self.crossword.overlaps[var, key]
-                # vars intersect
-                if intersect:
-                    # count answers for other vars that work with this word assigned
-                    for possibleAnswer in words:
-                        if word[intersect[0]] == possibleAnswer[intersect[1]]:
-                            n += 1
-            # assign n to word
-            newDomain[word] = n            
-        # sort words by n then return
-        return sorted(newDomain, key=lambda getNum: newDomain[getNum])
+        for word in self.crossword.words_in(var.length, self.domains[var]):
+            # answers for other vars that still work with this word assigned
+            newDomain[word] = sum(counts.get(word[i], 0) for i, counts in supports)
+
+        # huge domain: only sort the best few, the rest follow in word order
+        if self.top and len(newDomain) > self.top:
+            best = heapq.nlargest(self.top, newDomain, key=newDomain.get)
+            chosen = set(best)
+            return best + [word for word in newDomain if word not in chosen]
+        # sort words by n (most left for others first) then return
+        if self.random:
+            # random among words with the same n
+            tieBreak = {word: self.random.random() for word in newDomain}
+            return sorted(newDomain, key=lambda getNum: (-newDomain[getNum], tieBreak[getNum]))
+        return sorted(newDomain, key=lambda getNum: newDomain[getNum], reverse=True)
 
     def select_unassigned_variable(self, assignment):
         """
@@ -266,25 +365,26 @@ class CrosswordCreator():
         """
         # best var to assign
         bestVar = None
+        # how many vars are tied for best
+        ties = 0
         # each unassigned var
         for var in self.crossword.variables - set(assignment.keys()):
             # keep track of lowest
-            if not bestVar or len(self.domains[var]) < len(self.domains[bestVar]):
+            if not bestVar or self.domains[var].bit_count() < self.domains[bestVar].bit_count():
                 bestVar = var
+                ties = 1
 
             # same domain = whichever intersect with more
-            elif len(self.domains[bestVar]) == len(self.domains[bestVar]):
-
-                # how many intersects for current best var
-                bestVarDegree = len([intersect for key, intersect in self.crossword.overlaps.items()
-                    if intersect and bestVar in key])
-
-                # how many intersects for compared var
-                varDegree = len([intersect for key, intersect in self.crossword.overlaps.items()
-                    if intersect and var in key])
-                # take one with highest degree (equal then keep first one)
-                if varDegree > bestVarDegree:
+            elif self.domains[var].bit_count() == self.domains[bestVar].bit_count():
+                # take one with highest degree
+                if self.crossword.degree[var] > self.crossword.degree[bestVar]:
                     bestVar = var
+                    ties = 1
+                # equal then keep first one, or any of them with a seed
+                elif self.crossword.degree[var] == self.crossword.degree[bestVar] and self.random:
+                    ties += 1
+                    if self.random.randrange(ties) == 0:
+                        bestVar = var
         return bestVar
 
     def backtrack(self, assignment):
@@ -293,9 +393,13 @@ class CrosswordCreator():
         crossword and return a complete assignment if possible to do so.
 
         `assignment` is a mapping from variables (keys) to words (values).
+        It's changed in place and put back as it was if there's no answer.
 
         If no assignment is possible, return None.
         """
+        self.stats["nodes"] += 1
+        if self.nodeLimit is not None and self.stats["nodes"] > self.nodeLimit:
+            raise Restart
         if self.assignment_complete(assignment):
             return assignment
         # next var to assign
@@ -304,77 +408,166 @@ class CrosswordCreator():
         domainOptions = self.order_domain_values(unassignedVar, assignment)
 
         for option in domainOptions:
-            # try an answer for var
-            newAssignment = assignment.copy()
-            newAssignment[unassignedVar] = option
-            # if answer works:
-            if self.consistent(newAssignment):
-                # things that intersect with var answer
-                checkArcs = {key for key in self.crossword.overlaps.keys()
-                    if key and unassignedVar in key}
+            # if answer works with what's assigned already:
+            if self.consistent_with(assignment, unassignedVar, option):
+                # try an answer for var
+                assignment[unassignedVar] = option
+                self.used.add(option)
+                # where to undo domains back to if this answer doesn't work out
+                mark = len(self.trail)
                 # inferring process
-                inferred = self.inference(newAssignment, checkArcs)
-                if inferred:
-                    newAssignment = inferred
-                # continue search for answer
-                result = self.backtrack(newAssignment)
-                # found an answer for all vars
-                if result is not None:
-                    return result
+                inferred = self.inference(assignment, unassignedVar, mark)
+                if inferred is not None:
+                    # continue search for answer
+                    result = self.backtrack(assignment)
+                    # found an answer for all vars
+                    if result is not None:
+                        return result
+                    for var in inferred:
+                        self.used.discard(assignment.pop(var))
+                self.undo(mark)
+                del assignment[unassignedVar]
+                self.used.discard(option)
         # no answers worked, no solution
         return None
 
-    def inference(self, assignment, checkArcs):
-        """inferring process while backtracking"""
-
-        # copy of domains
-        domainsCopy = self.domains.copy()
-
-        # maintain arc consistency
-        consistent = self.ac3(checkArcs)
-
-        # didn't fail
-        if consistent:
-            # assignment with infers
-            inferredAnswer = assignment.copy()
-
-            # every var not assigned yet
-            for unassigned in self.crossword.variables - assignment:
-
-                # if only one answer can infer that must be the answer
-                possibleWords = self.domains[unassigned]
+    def inference(self, assignment, var, mark):
+        """
+        inferring process while backtracking, after `var` was just assigned
+        and the trail was `mark` entries long.
 
-                if len(possibleWords) == 1:
-                    inferredAnswer[unassigned] = possibleWords[0]
+        Narrows domains (on the trail) and adds any inferred answers to
+        `assignment`. Return the variables inferred, or None if `var`'s
+        answer can't work (with `assignment` left as it was).
+        """
+        # var's domain is just its answer now
+        word = assignment[var]
+        self.set_domain(var, 1 << self.crossword.word_index[word])
+
+        # maintain arc consistency with things that intersect with var
+        checkArcs = [(neighbor, var) for neighbor, _ in self.crossword.adjacent[var]]
+        if not self.ac3(checkArcs):
+            return None
+
+        # only domains that just changed can have gone down to one answer
+        inferred = []
+        for changed, _ in self.trail[mark:]:
+            # if only one answer can infer that must be the answer
+            possibleWords = self.domains[changed]
+
+            if changed not in assignment and possibleWords.bit_count() == 1:
+                answer = self.crossword.words_in(changed.length, possibleWords)[0]
+                # inferred answers can still repeat a word
+                if not self.consistent_with(assignment, changed, answer):
+                    for var in inferred:
+                        self.used.discard(assignment.pop(var))
+                    return None
+                assignment[changed] = answer
+                self.used.add(answer)
+                inferred.append(changed)
+
+        return inferred
+
+def portfolio(structure, words, processes=None, seed=0, top=None):
+    """
+    Solve with `processes` differently seeded solvers at once, alternating
+    between the ORDERINGS and restarting each when it gets stuck, since
+    how long one search takes depends a lot on the order it tries things.
+
+    Return (assignment, stats) from whichever finishes first, found an
+    answer or proved there is none, and stop the rest. If every solver
+    fails instead, raise the first one's error.
+    """
+    processes = processes or os.cpu_count() or 1
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=portfolio_worker,
+            args=(structure, words, seed + k, ORDERINGS[k % len(ORDERINGS)], top, results),
+            daemon=True
+        )
+        for k in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        failures = []
+        while len(failures) < len(workers):
+            try:
+                outcome = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if any(worker.is_alive() for worker in workers):
+                    continue
+                # all gone: whatever they put last may still be on its way
+                try:
+                    outcome = results.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    if failures:
+                        raise failures[0]
+                    codes = [worker.exitcode for worker in workers]
+                    raise RuntimeError(f"portfolio solvers died with exit codes {codes}")
+            if isinstance(outcome, Exception):
+                failures.append(outcome)
+            else:
+                return outcome
+        raise failures[0]
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def portfolio_worker(structure, words, seed, ordering, top, results):
+    """
+    Run one portfolio solver and put (assignment, stats) on `results`,
+    or the exception it failed with.
+    """
+    try:
+        creator = CrosswordCreator(Crossword(structure, words), top, seed, ordering)
+        assignment = creator.solve_restarts()
+    except Exception as error:
+        results.put(error)
+        return
+    creator.stats.update(seed=seed, ordering=ordering)
+    results.put((assignment, creator.stats))
 
-            return inferredAnswers
-        else:  # failed then revert domains            
-            self.domains = domainsCopy
-            return False
 
 def main():
-
-    # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
-
-    # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    parser = argparse.ArgumentParser(description="Generate a crossword puzzle.")
+    parser.add_argument("structure", help="crossword structure file")
+    parser.add_argument("words", help="words file")
+    parser.add_argument("output", nargs="?", help="image file to save the puzzle to")
+    parser.add_argument("-p", "--portfolio", type=int, metavar="N",
+                        help="race N randomized solvers in parallel")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="first seed for the portfolio solvers (default: 0)")
+    parser.add_argument("-t", "--top", type=int,
+                        help="only sort the best TOP values of each domain")
+    args = parser.parse_args()
 
     # Generate crossword
-    crossword = Crossword(structure, words)
-    creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    crossword = Crossword(args.structure, args.words)
+    creator = CrosswordCreator(crossword, args.top)
+    if args.portfolio:
+        assignment, stats = portfolio(args.structure, args.words, args.portfolio,
+                                      args.seed, args.top)
+    else:
+        assignment = creator.solve()
+        stats = creator.stats
 
     # Print result
     if assignment is None:
         print("No solution.")
     else:
         creator.print(assignment)
-        if output:
-            creator.save(assignment, output)
+        print(f"Explored {stats['nodes']} nodes "
+              f"with {stats['checks']} consistency checks")
+        if args.portfolio:
+            print(f"Solved by seed {stats['seed']} ({stats['ordering']} ordering, "
+                  f"{stats['restarts']} restarts)")
+        if args.output:
+            creator.save(assignment, args.output)
 
 
 if __name__ == "__main__":